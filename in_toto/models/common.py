@@ -102,14 +102,16 @@ class Signable(Metablock):
     if not self.signatures or len(self.signatures) <= 0:
       raise SignatureVerificationError("No signatures found")
 
+    # Create the canonical payload only once for all signatures
+    payload = self.payload
+
     for signature in self.signatures:
       keyid = signature["keyid"]
-      try:
-        key = keys_dict[keyid]
-      except KeyError:
+      key = keys_dict.get(keyid)
+      if key is None:
         raise SignatureVerificationError(
             "Signature key not found, key id is '{0}'".format(keyid))
       if not securesystemslib.keys.verify_signature(
-          key, signature, self.payload):
+          key, signature, payload):
         raise SignatureVerificationError("Invalid signature")
 
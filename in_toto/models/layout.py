@@ -41,12 +41,31 @@ from dateutil.parser import parse
 from in_toto.models.link import (UNFINISHED_FILENAME_FORMAT, FILENAME_FORMAT)
 import in_toto.artifact_rules
 import in_toto.exceptions
+import in_toto.util
 import securesystemslib.exceptions
 import securesystemslib.formats
 
 # import validators
 from . import common as models__common
 from . import link as models__link
+
+
+# Minimum number of link metadata files read in the pool of threads of
+# `in_toto.util.map_concurrently`. Reading and parsing a small link file from a
+# local disk takes a few dozen microseconds, i.e. only many links or a slow
+# (e.g. network) file system pay for dispatching them to the pool.
+_CONCURRENT_READING_MIN_LINKS = 16
+
+def _read_link_from_file_or_none(filename):
+  """Internal helper that returns the Link read from the passed filename, or
+  None if the file can not be read, e.g. because it does not exist. """
+  try:
+    return models__link.Link.read_from_file(filename)
+
+  except IOError:
+    return None
+
+
 @attr.s(repr=False, init=False)
 class Layout(models__common.Signable):
   """
@@ -129,10 +148,10 @@ class Layout(models__common.Signable):
   def import_step_metadata_from_files_as_dict(self):
     """
     <Purpose>
-      Iteratively loads link metadata files for each Step of the Layout
-      from disk and returns a dict with Link names as keys and a dict
-      as values. The inner dict contains key_id as keys and link
-      objects as values.
+      Loads link metadata files for each Step of the Layout from disk,
+      concurrently if there are many of them, and returns a dict with Link
+      names as keys and a dict as values. The inner dict contains key_id as
+      keys and link objects as values.
 
     <Arguments>
       None
@@ -148,16 +167,28 @@ class Layout(models__common.Signable):
       as values.
 
     """
+    filenames = [FILENAME_FORMAT.format(step_name=step.name, keyid=keyid)
+        for step in self.steps for keyid in step.pubkeys]
+
+    # Reading link files is I/O bound, so if there are enough of them we read
+    # all of them at once in a pool of threads, and then assemble and check
+    # the results step by step. Otherwise we read each file only when its step
+    # is checked, i.e. we don't read the files of later steps if a step was not
+    # performed by enough functionaries.
+    if len(filenames) < _CONCURRENT_READING_MIN_LINKS:
+      links = (_read_link_from_file_or_none(filename)
+          for filename in filenames)
+
+    else:
+      links = iter(in_toto.util.map_concurrently(_read_link_from_file_or_none,
+          filenames))
+
     step_link_dict = {}
     for step in self.steps:
       key_link_dict = {}
       for keyid in step.pubkeys:
-        try:
-          link = models__link.Link.read_from_file(FILENAME_FORMAT.format(
-              step_name=step.name, keyid=keyid))
-        except IOError as e:
-          pass
-        else:
+        link = next(links)
+        if link is not None:
           key_link_dict[keyid] = link
       if len(key_link_dict) < step.threshold:
         raise in_toto.exceptions.LinkNotFoundError("Step not"
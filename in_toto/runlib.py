@@ -30,6 +30,7 @@ import tempfile
 import fnmatch
 
 import in_toto.settings
+import in_toto.util
 from in_toto import log
 from in_toto.models.link import (UNFINISHED_FILENAME_FORMAT, FILENAME_FORMAT)
 
@@ -50,16 +51,42 @@ else:
   import subprocess
 
 
-def _hash_artifact(filepath, hash_algorithms=['sha256']):
+# Number of bytes read from an artifact at once to update its digests. Larger
+# chunks mean fewer calls into the hash library, which also releases the
+# global interpreter lock for the duration of each update.
+_HASH_CHUNK_SIZE = 65536
+
+# Minimum number of artifacts hashed in the pool of threads of
+# `in_toto.util.map_concurrently`. Small files are hashed in a few dozen
+# microseconds, i.e. for a handful of them dispatching them to the pool costs
+# more than it saves.
+_CONCURRENT_HASHING_MIN_ARTIFACTS = 16
+
+def _hash_artifact(filepath, hash_algorithms=None):
   """Internal helper that takes a filename and hashes the respective file's
-  contents using the passed hash_algorithms and returns a hashdict conformant
-  with securesystemslib.formats.HASHDICT_SCHEMA. """
+  contents using the passed hash_algorithms (default ARTIFACT_HASH_ALGORITHMS,
+  see in_toto.settings) and returns a hashdict conformant with
+  securesystemslib.formats.HASHDICT_SCHEMA. The file is read only once, no
+  matter how many hash algorithms are used. """
+  if hash_algorithms is None:
+    hash_algorithms = in_toto.settings.ARTIFACT_HASH_ALGORITHMS
+
   securesystemslib.formats.HASHALGORITHMS_SCHEMA.check_match(hash_algorithms)
-  hash_dict = {}
 
-  for algorithm in hash_algorithms:
-    digest_object = securesystemslib.hash.digest_filename(filepath, algorithm)
-    hash_dict.update({algorithm: digest_object.hexdigest()})
+  digest_objects = [securesystemslib.hash.digest(algorithm)
+      for algorithm in hash_algorithms]
+
+  with open(filepath, "rb") as file_object:
+    while True:
+      data = file_object.read(_HASH_CHUNK_SIZE)
+      if not data:
+        break
+
+      for digest_object in digest_objects:
+        digest_object.update(data)
+
+  hash_dict = dict((algorithm, digest_object.hexdigest())
+      for algorithm, digest_object in zip(hash_algorithms, digest_objects))
 
   securesystemslib.formats.HASHDICT_SCHEMA.check_match(hash_dict)
 
@@ -140,6 +167,10 @@ def record_artifacts_as_dict(artifacts):
     except OSError as e:
       raise OSError("Review your ARTIFACT_BASE_PATH setting - {}".format(e))
 
+  # Paths of all files to be recorded, which are hashed concurrently once the
+  # passed artifacts were traversed
+  record_filepaths = []
+
   # Normalize passed paths
   norm_artifacts = []
   for path in artifacts:
@@ -156,7 +187,7 @@ def record_artifacts_as_dict(artifacts):
 
     if os.path.isfile(artifact):
       # Path was already normalized above
-      artifacts_dict[artifact] = _hash_artifact(artifact)
+      record_filepaths.append(artifact)
 
     elif os.path.isdir(artifact):
       for root, dirs, files in os.walk(artifact):
@@ -192,11 +223,16 @@ def record_artifacts_as_dict(artifacts):
                 .format(norm_filepath))
 
         # Apply exclude patterns on normalized filepaths and
-        # store each remaining normalized filepath with it's files hash to
-        # the resulting artifact dict
-        for filepath in _apply_exclude_patterns(filepaths,
-            in_toto.settings.ARTIFACT_EXCLUDES):
-          artifacts_dict[filepath] = _hash_artifact(filepath)
+        # queue each remaining normalized filepath for hashing
+        record_filepaths += _apply_exclude_patterns(filepaths,
+            in_toto.settings.ARTIFACT_EXCLUDES)
+
+  # Hash the files, concurrently if there are enough of them (hashlib releases
+  # the GIL while digesting), and store each normalized filepath with it's
+  # files hash to the resulting artifact dict
+  artifacts_dict.update(zip(record_filepaths,
+      in_toto.util.map_concurrently(_hash_artifact, record_filepaths,
+          min_items=_CONCURRENT_HASHING_MIN_ARTIFACTS)))
 
   # Change back to where original current working dir
   if in_toto.settings.ARTIFACT_BASE_PATH:
@@ -45,3 +45,16 @@ ARTIFACT_EXCLUDES = ["*.link*", ".git", "*.pyc", "*~"]
 # FIXME: This is likely to become a command line argument
 # FIXME: Do we want different base paths for materials and products?
 ARTIFACT_BASE_PATH = None
+
+# Hash algorithms used to record materials and products. Rule verification
+# compares the entire hash dictionaries of artifacts and is thus agnostic to
+# the algorithms chosen here, as long as all links of a supply chain use the
+# same ones.
+# FIXME: This is likely to become a command line argument
+ARTIFACT_HASH_ALGORITHMS = ["sha256"]
+
+# Maximum number of threads used to do I/O bound work concurrently, e.g. to
+# hash artifacts when recording materials and products, or to read link
+# metadata files and verify their signatures
+# FIXME: This is likely to become a command line argument
+MAX_THREADS = 8
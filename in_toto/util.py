@@ -3,7 +3,13 @@ import sys
 import pickle
 import json
 import getpass
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
+import six
+
+import in_toto.settings
 from in_toto import log
 import securesystemslib.formats
 import securesystemslib.hash
@@ -113,6 +119,80 @@ def import_rsa_public_keys_from_files_as_dict(filepaths):
     key_dict[keyid] = key
   return key_dict
 
+# Pool of threads shared by all calls to `map_concurrently`. It is created on
+# first use and reused afterwards, because closing and joining a pool takes
+# about 100 ms on Python 2, which is far more than most of our workloads take.
+_thread_pool = None
+_thread_pool_lock = threading.Lock()
+
+def _get_thread_pool():
+  """Internal helper that returns the shared pool of MAX_THREADS (see
+  in_toto.settings) threads, creating it if it does not exist yet. """
+  global _thread_pool
+  with _thread_pool_lock:
+    if _thread_pool is None:
+      _thread_pool = ThreadPool(in_toto.settings.MAX_THREADS)
+
+  return _thread_pool
+
+
+def map_concurrently(function, iterable, min_items=2):
+  """
+  <Purpose>
+    Calls the passed function on each element of the passed iterable using a
+    shared pool of MAX_THREADS (see in_toto.settings) threads. This only pays
+    off for work that does not hold the global interpreter lock most of the
+    time, e.g. reading files or hashing.
+
+    If there are fewer than min_items elements, or only one CPU, the function
+    is called on each element in the current thread, i.e. no pool is used.
+
+    The passed function must not itself call map_concurrently, as it could
+    wait forever for a thread of the shared pool.
+
+  <Arguments>
+    function:
+            A function that takes exactly one argument.
+
+    iterable:
+            An iterable of arguments to call the function with.
+
+    min_items: (optional)
+            The minimum number of elements for which the pool is used. Callers
+            should pass a number of elements whose processing takes clearly
+            longer than dispatching them to the pool.
+
+  <Exceptions>
+    Re-raises the exception raised by the function for the first element (in
+    order of the passed iterable) it raised an exception for.
+
+  <Side Effects>
+    Creates the shared pool of threads, if it does not exist yet.
+
+  <Returns>
+    A list of the return values of the function, in the order of the passed
+    iterable.
+  """
+  items = list(iterable)
+
+  if len(items) < max(min_items, 2) or multiprocessing.cpu_count() < 2:
+    return [function(item) for item in items]
+
+  def call(item):
+    try:
+      return True, function(item)
+
+    except Exception:
+      return False, sys.exc_info()
+
+  results = []
+  for succeeded, result in _get_thread_pool().map(call, items):
+    if not succeeded:
+      six.reraise(*result)
+    results.append(result)
+
+  return results
+
 def prompt_password(prompt="Enter password: "):
   """Prompts for password input and returns the password. """
   return getpass.getpass(prompt, sys.stderr)
@@ -27,11 +27,10 @@
 """
 
 import os
+import re
 import datetime
-import iso8601
 import fnmatch
 import six
-from dateutil import tz
 
 import securesystemslib.exceptions
 
@@ -41,7 +40,8 @@ import in_toto.runlib
 import in_toto.models.layout
 import in_toto.models.link
 from in_toto.exceptions import (RuleVerficationError, LayoutExpiredError,
-    ThresholdVerificationError, BadReturnValueError)
+    ThresholdVerificationError, BadReturnValueError,
+    SignatureVerificationError)
 import in_toto.artifact_rules
 import in_toto.log as log
 
@@ -84,6 +84,213 @@ def _raise_on_bad_retval(return_value, command=None):
     raise BadReturnValueError(msg.format(what="zero"))
 
 
+# Maximum number of entries of each of the caches below. Like the cache of the
+# `re` module, a full cache is simply cleared, so that long-running processes
+# that verify many different layouts don't grow it without limit.
+_MAX_CACHE_SIZE = 1000
+
+# Cache for compiled glob patterns of artifact rules (see `_compile_pattern`)
+_compiled_patterns = {}
+
+def _is_literal(pattern):
+  """Internal helper that returns True if the passed glob pattern contains no
+  wildcards, i.e. only matches the path it spells out. """
+  return not ("*" in pattern or "?" in pattern or "[" in pattern)
+
+
+def _compile_pattern(pattern, prefix=""):
+  """Internal helper that compiles the passed glob pattern to a matcher.
+  Results are cached, i.e. each distinct pattern is only compiled once, no
+  matter how many rules, items and artifacts it is applied to.
+
+  Patterns that don't need the regular expression engine are classified and
+  matched using plain string operations instead:
+    - literal paths, e.g. "foo.py", are compared for equality
+    - suffix patterns, e.g. "*.py" or "*", use `str.endswith`
+    - prefix patterns, e.g. "src/*", use `str.startswith`
+  All other patterns are translated to a compiled regular expression.
+
+  If a path prefix is passed, the matcher only matches paths in the prefix
+  directory, whose remainder matches the glob pattern. The prefix is taken
+  literally, i.e. it does not glob.
+
+  Returns a tuple of the literal path the pattern matches (None if the pattern
+  contains wildcards) and a function that takes a path and returns whether it
+  matches. """
+  cache_key = (prefix, pattern)
+  compiled = _compiled_patterns.get(cache_key)
+  if compiled is None:
+    if prefix:
+      prefix = prefix + os.sep
+
+    if _is_literal(pattern):
+      literal_path = prefix + pattern
+      match = lambda path: path == literal_path
+      compiled = (literal_path, match)
+
+    elif pattern.startswith("*") and _is_literal(pattern[1:]):
+      suffix = pattern[1:]
+      # The prefix and suffix must not overlap in the matched path
+      min_len = len(prefix) + len(suffix)
+      match = lambda path: (len(path) >= min_len and
+          path.startswith(prefix) and path.endswith(suffix))
+      compiled = (None, match)
+
+    elif pattern.endswith("*") and _is_literal(pattern[:-1]):
+      path_prefix = prefix + pattern[:-1]
+      match = lambda path: path.startswith(path_prefix)
+      compiled = (None, match)
+
+    else:
+      regex = re.escape(prefix) + fnmatch.translate(pattern)
+      compiled = (None, re.compile(regex).match)
+
+    if len(_compiled_patterns) >= _MAX_CACHE_SIZE:
+      _compiled_patterns.clear()
+    _compiled_patterns[cache_key] = compiled
+
+  return compiled
+
+
+def _filter_artifacts(artifact_paths, pattern, prefix=""):
+  """Internal helper that returns a list of the passed artifact paths matched by
+  the passed glob pattern (and optional path prefix, see `_compile_pattern`).
+  Behaves like `fnmatch.filter` (case-sensitive, see `fnmatch.fnmatchcase`) but
+  uses the cached compiled pattern. """
+  literal_path, match = _compile_pattern(pattern, prefix)
+
+  # A literal pattern can match at most one path, no need to scan all paths
+  if literal_path is not None:
+    if literal_path in artifact_paths:
+      return [literal_path]
+    return []
+
+  return [path for path in artifact_paths if match(path)]
+
+
+# Rule types that, for a given source type, consume (or fail on) each artifact
+# of the source artifacts queue they match, while the other queue remains
+# unchanged. This means that each artifact is handled by the first rule that
+# matches it (see `_bucket_artifacts_by_rule`), as long as no CREATE or DELETE
+# rule comes after a MATCH or ALLOW rule. CREATE and DELETE rules also see the
+# artifacts consumed by MATCH and ALLOW rules (see `_RULE_VERIFIERS`).
+_SINGLE_PASS_RULE_TYPES = {
+  "materials": frozenset(["match", "allow", "disallow", "delete"]),
+  "products": frozenset(["match", "allow", "disallow", "create"])
+}
+
+# The regular expression engine supports at most 100 groups per pattern
+_SINGLE_PASS_MAX_RULES = 99
+
+def _is_single_pass(rules_data, source_type):
+  """Internal helper that returns True if the passed unpacked material or
+  product rules can be verified in a single pass (see
+  `_SINGLE_PASS_RULE_TYPES`), and False otherwise. """
+  if not 1 < len(rules_data) <= _SINGLE_PASS_MAX_RULES:
+    return False
+
+  consumed = False
+  for rule_data in rules_data:
+    rule_type = rule_data["type"]
+    if rule_type not in _SINGLE_PASS_RULE_TYPES[source_type]:
+      return False
+
+    if consumed and rule_type in ("create", "delete"):
+      return False
+
+    if rule_type in ("match", "allow"):
+      consumed = True
+
+  return True
+
+
+def _translate_pattern(pattern, prefix=""):
+  """Internal helper that translates the passed glob pattern and optional path
+  prefix (see `_compile_pattern`) to a regular expression, without the inline
+  flags that `fnmatch.translate` appends on Python 2, so that the expression
+  can be embedded in a larger one. Compile with re.S | re.M to match like
+  `fnmatch.translate`. """
+  regex = fnmatch.translate(pattern)
+  if regex.endswith("(?ms)"):
+    regex = regex[:-len("(?ms)")]
+
+  if prefix:
+    regex = re.escape(prefix + os.sep) + regex
+
+  return regex
+
+
+# Cache for unpacked rules and their compiled patterns (see `_compile_rules`)
+_compiled_rules = {}
+
+def _compile_rules(rules, source_type):
+  """Internal helper that unpacks the passed material or product rules (see
+  `in_toto.artifact_rules.unpack_rule`) and, if the rules can be verified in a
+  single pass (see `_is_single_pass`), compiles their patterns to a single
+  regular expression, with one named group per rule. Results are cached, i.e.
+  items with identical rules share the unpacked rules and the compiled regular
+  expression.
+
+  Returns a tuple of the list of unpacked rules and the compiled regular
+  expression, or None if the rules can't be verified in a single pass. """
+  # Only rules that are lists of strings are cached. The cache key can't be
+  # built from other rules (e.g. with nested lists), or would map invalid rules
+  # (e.g. tuples) to the same entry as valid ones. Such rules are unpacked
+  # without the cache, which raises the appropriate format error.
+  cache_key = None
+  if all(isinstance(rule, list) and all(
+      isinstance(element, six.string_types) for element in rule)
+      for rule in rules):
+    cache_key = (source_type, tuple(tuple(rule) for rule in rules))
+
+  compiled = None
+  if cache_key is not None:
+    compiled = _compiled_rules.get(cache_key)
+
+  if compiled is None:
+    rules_data = [in_toto.artifact_rules.unpack_rule(rule) for rule in rules]
+
+    union_regex = None
+    if _is_single_pass(rules_data, source_type):
+      union_regex = re.compile("|".join(
+          "(?P<r{0}>{1})".format(index, _translate_pattern(
+              rule_data["pattern"], rule_data.get("source_prefix")))
+          for index, rule_data in enumerate(rules_data)), re.S | re.M)
+
+    compiled = (rules_data, union_regex)
+
+    if cache_key is not None:
+      if len(_compiled_rules) >= _MAX_CACHE_SIZE:
+        _compiled_rules.clear()
+      _compiled_rules[cache_key] = compiled
+
+  return compiled
+
+
+def _bucket_artifacts_by_rule(artifact_paths, union_regex, rules_count):
+  """Internal helper that scans the passed artifact paths once, using the
+  passed regular expression with one named group per rule (see
+  `_compile_rules`), and assigns each path to the first rule that matches it.
+
+  Returns a list with a set of paths per rule (in the order of the rules) and
+  a final set of paths not matched by any rule. """
+  buckets = [set() for _ in range(rules_count + 1)]
+  buckets_by_group = dict(("r{0}".format(index), bucket)
+      for index, bucket in enumerate(buckets))
+  unmatched = buckets[-1]
+
+  # Alternatives are tried in order, i.e. the group of the first matching rule
+  # is the only (outer) group that participates in the match
+  for path in artifact_paths:
+    match = union_regex.match(path)
+    if match is None:
+      unmatched.add(path)
+    else:
+      buckets_by_group[match.lastgroup].add(path)
+
+  return buckets
+
+
 def run_all_inspections(layout):
   """
   <Purpose>
@@ -110,6 +317,12 @@ def run_all_inspections(layout):
     the key is the Inspection name.
   """
   inspection_links_dict = {}
+
+  # NOTE: Inspections are not run concurrently, because they all record (and
+  # may modify) the current working directory, i.e. an inspection's materials
+  # and products would depend on other inspections running at the same time.
+  # Instead, runlib hashes the recorded artifacts of each inspection
+  # concurrently.
   for inspection in layout.inspect:
     log.info("Executing command for inspection '{}'...".format(
         inspection.name))
@@ -159,6 +372,11 @@ def verify_layout_expiration(layout):
     None.
 
   """
+  # Only needed here, i.e. not imported at module level to not slow down
+  # importing verifylib for other functions
+  import iso8601
+  from dateutil import tz
+
   expire_datetime = iso8601.parse_date(layout.expires)
   if expire_datetime < datetime.datetime.now(tz.tzutc()):
     raise LayoutExpiredError("Layout expired")
@@ -214,6 +432,26 @@ def verify_link_signatures(link, keys_dict):
   link.verify_signatures(keys_dict)
 
 
+# Minimum number of links whose signatures are verified in the pool of threads
+# of `in_toto.util.map_concurrently`. Verifying the signature of a link takes
+# about half a millisecond, i.e. a few links already pay for dispatching them
+# to the pool.
+_CONCURRENT_SIGNATURES_MIN_LINKS = 4
+
+def _verify_link_signatures_of_file(link_filename, link, keys_dict):
+  """Internal helper that logs and verifies the signatures of the passed link
+  (see `verify_link_signatures`), and names the passed link metadata filename
+  in the error if the verification fails. """
+  log.info("Verifying signature(s) for '{0}'...".format(link_filename))
+
+  try:
+    verify_link_signatures(link, keys_dict)
+
+  except SignatureVerificationError as e:
+    raise SignatureVerificationError("Link '{0}': {1}".format(
+        link_filename, e))
+
+
 def verify_all_steps_signatures(layout, chain_link_dict):
   """
   <Purpose>
@@ -236,25 +474,42 @@ def verify_all_steps_signatures(layout, chain_link_dict):
   <Side Effects>
     Verifies cryptographic Link signatures of potentially multiple Links
     related to Steps of a Layout.
+    Links are verified concurrently, if there are enough of them.
 
   """
-  for step in layout.steps:
-    keys_dict = {}
+  # Collect all links of all steps with the keys to verify them first and
+  # verify them in one go afterwards. The underlying crypto library releases
+  # the GIL, i.e. signatures of different links are verified concurrently.
+  link_verification_args = []
+
+  # Dictionaries of keys by the set of keyids they contain. Steps performed
+  # by the same functionaries share a single dictionary. Note that each step's
+  # links must only be verified with the keys of that step, i.e. we can't
+  # just pass all keys of the layout.
+  keys_dicts = {}
 
+  for step in layout.steps:
     # Find the according link for this step
     key_link_dict = chain_link_dict[step.name]
 
-    # Create the dictionary of keys for this step
-    for pubkeyid in step.pubkeys:
-      keys_dict[pubkeyid] = layout.keys[pubkeyid]
+    # Create (or reuse) the dictionary of keys for this step
+    pubkeyids = frozenset(step.pubkeys)
+    keys_dict = keys_dicts.get(pubkeyids)
+    if keys_dict is None:
+      keys_dict = dict((pubkeyid, layout.keys[pubkeyid])
+          for pubkeyid in pubkeyids)
+      keys_dicts[pubkeyids] = keys_dict
 
     for keyid, link in six.iteritems(key_link_dict):
-      log.info("Verifying signature(s) for '{0}'...".format(
-          in_toto.models.link.FILENAME_FORMAT.format(step_name=step.name,
-              keyid=keyid)))
+      link_filename = in_toto.models.link.FILENAME_FORMAT.format(
+          step_name=step.name, keyid=keyid)
+      link_verification_args.append((link_filename, link, keys_dict))
 
-      # Verify link metadata file's signatures
-      verify_link_signatures(link, keys_dict)
+  # Verify link metadata files' signatures. If several fail, the error of the
+  # first one (in the order they were collected above) is raised.
+  in_toto.util.map_concurrently(
+      lambda args: _verify_link_signatures_of_file(*args),
+      link_verification_args, min_items=_CONCURRENT_SIGNATURES_MIN_LINKS)
 
 
 def verify_command_alignment(command, expected_command):
@@ -327,7 +582,8 @@ def verify_all_steps_command_alignment(layout, chain_link_dict):
       verify_command_alignment(command, expected_command)
 
 
-def verify_match_rule(rule, source_artifacts_queue, source_artifacts, links):
+def verify_match_rule(rule, source_artifacts_queue, source_artifacts, links,
+    rule_data=None):
   """
   <Purpose>
     Verifies that for each queued source artifact filtered by the specified
@@ -386,7 +642,7 @@ def verify_match_rule(rule, source_artifacts_queue, source_artifacts, links):
                 ["IN", "<destination-path-prefix>",] "FROM" "<step>"]
 
     source_artifacts_queue:
-            A list of artifact paths that haven't been handled by a previous
+            A set of artifact paths that haven't been handled by a previous
             rule of the step/inspection.
 
     source_artifacts:
@@ -400,6 +656,10 @@ def verify_match_rule(rule, source_artifacts_queue, source_artifacts, links):
             The Link objects relate to Steps or Inspections. The contained
             materials and products are used as rule destination.
 
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
+
   <Exceptions>
     FormatError
         if the rule does not conform with the rule format.
@@ -412,93 +672,82 @@ def verify_match_rule(rule, source_artifacts_queue, source_artifacts, links):
         artifact are not equal.
 
   <Side Effects>
-    None.
+    Removes matched artifacts from the passed source artifacts queue.
 
   <Returns>
-    A list of artifacts that were matched by the rule.
+    The updated source artifacts queue (minus matched artifacts).
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
   dest_name = rule_data["dest_name"]
   dest_type = rule_data["dest_type"]
 
   # Extract destination link
-  try:
-    dest_link = links[dest_name]
-  except Exception as e:
+  dest_link = links.get(dest_name)
+  if dest_link is None:
     raise RuleVerficationError("Rule '{rule}' failed, destination link"
         " '{dest_link}' not found in link dictionary".format(
             rule=" ".join(rule), dest_link=dest_name))
 
   # Extract destination artifacts from destination link
-  if dest_type.lower() == "materials":
+  # (unpack_rule returns the destination type in lower case)
+  if dest_type == "materials":
     dest_artifacts = dest_link.materials
-  elif dest_type.lower() == "products":
+  elif dest_type == "products":
     dest_artifacts = dest_link.products
 
-  # Filter I - take only queued paths with specified prefix and
-  # subtract prefix
-  # We first subtract the prefix and then apply the pattern in Filter II
-  # (instead of applying prefix + pattern) to prevent globbing in the prefix
-  if rule_data["source_prefix"]:
-    filtered_source_paths = []
-    for artifact_path in source_artifacts_queue:
-      if artifact_path.startswith(rule_data["source_prefix"] + os.sep):
-        filtered_source_paths.append(
-            artifact_path[len(rule_data["source_prefix"] + os.sep):])
-  else:
-    filtered_source_paths = source_artifacts_queue
-
-  # Filter II - apply glob pattern on remaining artifact paths
-  filtered_source_paths = fnmatch.filter(
-      filtered_source_paths, rule_data["pattern"])
-
-  # Match source artifact with destination artifact
-  for path in filtered_source_paths:
-
-    # If we subtracted an optional source prefix in Filter I we have to
-    # re-concatenate to find the correct keys in the source artifact dictionary
-    if rule_data["source_prefix"]:
-      full_source_path = rule_data["source_prefix"] + os.sep + path
-    else:
-      full_source_path = path
+  # Filter queued paths with the optional source prefix and the glob pattern
+  # in a single pass. The prefix is matched literally, i.e. it does not glob.
+  filtered_source_paths = _filter_artifacts(source_artifacts_queue,
+      rule_data["pattern"], rule_data["source_prefix"])
 
-    # We have to concatenate filtered source path (without source prefix)
-    # with an optional destination prefix to find the correct key in the
-    # destination artifact dictionary
-    if rule_data["dest_prefix"]:
-      full_dest_path = rule_data["dest_prefix"] + os.sep + path
-    else:
-      full_dest_path = path
-
-    # Is it okay to assume that full_source_path returns an artifact? The path
-    # should not be in the queue, if it is not in the artifact dictionary
-    source_artifact = source_artifacts[full_source_path]
-
-    # Extract destination artifact from destination link
-    try:
-      dest_artifact = dest_artifacts[full_dest_path]
-    except Exception:
+  # Source paths are relocated to destination paths by replacing the optional
+  # source prefix with the optional destination prefix. Both are the same for
+  # all filtered paths, so we prepare them once, outside of the loop.
+  source_prefix_len = 0
+  if rule_data["source_prefix"]:
+    source_prefix_len = len(rule_data["source_prefix"] + os.sep)
+
+  dest_prefix = ""
+  if rule_data["dest_prefix"]:
+    dest_prefix = rule_data["dest_prefix"] + os.sep
+
+  # Pair each filtered source path with its destination path
+  path_pairs = [(source_path, dest_prefix + source_path[source_prefix_len:])
+      for source_path in filtered_source_paths]
+
+  # Each filtered source artifact needs a destination artifact with an equal
+  # hash. We look for the first pair of paths that fails either check, i.e.
+  # the same pair that checking one path after another would fail on. Is it
+  # okay to assume that each source path returns an artifact? The path should
+  # not be in the queue, if it is not in the artifact dictionary.
+  failed_path_pair = next(((source_path, dest_path)
+      for source_path, dest_path in path_pairs
+      if source_artifacts[source_path] != dest_artifacts.get(dest_path)),
+      None)
+
+  if failed_path_pair is not None:
+    source_path, dest_path = failed_path_pair
+    if dest_path not in dest_artifacts:
       raise RuleVerficationError("Rule '{rule}' failed, destination artifact"
           " '{path}' not found in {type} of '{name}'"
-              .format(rule=" ".join(rule), path=full_dest_path, name=dest_name,
+              .format(rule=" ".join(rule), path=dest_path, name=dest_name,
                   type=dest_type))
 
-    # Compare the hashes of source and destination artifacts
-    if source_artifact != dest_artifact:
-      raise RuleVerficationError("Rule '{rule}' failed, source artifact"
-          " '{source}' and destination artifact '{dest}' hashes don't match."
-              .format(rule=" ".join(rule), source=full_source_path,
-                  dest=full_dest_path))
+    raise RuleVerficationError("Rule '{rule}' failed, source artifact"
+        " '{source}' and destination artifact '{dest}' hashes don't match."
+            .format(rule=" ".join(rule), source=source_path, dest=dest_path))
 
-    # Matching went well, let's remove the path from the queue. Subsequent rules
-    # won't see this artifact anymore.
-    source_artifacts_queue.remove(full_source_path)
+  # Matching went well, let's remove the paths from the queue. Subsequent
+  # rules won't see these artifacts anymore.
+  source_artifacts_queue.difference_update(filtered_source_paths)
 
   return source_artifacts_queue
 
 
-def verify_create_rule(rule, source_materials_queue, source_products_queue):
+def verify_create_rule(rule, source_materials_queue, source_products_queue,
+    rule_data=None):
   """
   <Purpose>
     The create rule guarantees that no product filtered by the pattern, already
@@ -524,10 +773,14 @@ def verify_create_rule(rule, source_materials_queue, source_products_queue):
             See https://docs.python.org/2/library/fnmatch.html for wildcards
 
     source_materials_queue:
-            A list of material paths that were not matched by a previous rule.
+            A set of material paths that were not matched by a previous rule.
 
     source_products_queue:
-            A list of product paths that were not matched by a previous rule.
+            A set of product paths that were not matched by a previous rule.
+
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
 
   <Exceptions>
     RuleVerficationError
@@ -535,28 +788,36 @@ def verify_create_rule(rule, source_materials_queue, source_products_queue):
         queue.
 
   <Side Effects>
-    None.
+    Removes newly created artifacts from the passed products queue.
 
   <Returns>
     The updated products queue (minus newly created artifacts).
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
 
 
-  matched_products = fnmatch.filter(
-      source_products_queue, rule_data["pattern"])
+  # Only products that also appear in the materials queue can fail the rule,
+  # so we only look at those and stop at the first one matched by the pattern
+  _, match = _compile_pattern(rule_data["pattern"])
+  not_created_product = next((path
+      for path in source_products_queue & source_materials_queue
+      if match(path)), None)
 
-  for matched_product in matched_products:
-    if matched_product in source_materials_queue:
-      raise RuleVerficationError("Rule '{0}' failed, product '{1}' was found"
-          " in materials but should have been newly created."
-              .format(" ".join(rule), matched_product))
+  if not_created_product is not None:
+    raise RuleVerficationError("Rule '{0}' failed, product '{1}' was found"
+        " in materials but should have been newly created."
+            .format(" ".join(rule), not_created_product))
+
+  source_products_queue.difference_update(_filter_artifacts(
+      source_products_queue, rule_data["pattern"]))
 
-  return list(set(source_products_queue) - set(matched_products))
+  return source_products_queue
 
 
-def verify_delete_rule(rule, source_materials_queue, source_products_queue):
+def verify_delete_rule(rule, source_materials_queue, source_products_queue,
+    rule_data=None):
   """
   <Purpose>
     The delete rule guarantees that no material filtered by the pattern also
@@ -582,10 +843,14 @@ def verify_delete_rule(rule, source_materials_queue, source_products_queue):
             See https://docs.python.org/2/library/fnmatch.html for wildcards
 
     source_materials_queue:
-            A list of material paths that were not matched by a previous rule.
+            A set of material paths that were not matched by a previous rule.
 
     source_products_queue:
-            A list of product paths that were not matched by a previous rule.
+            A set of product paths that were not matched by a previous rule.
+
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
 
   <Exceptions>
     RuleVerficationError
@@ -593,28 +858,35 @@ def verify_delete_rule(rule, source_materials_queue, source_products_queue):
         queue.
 
   <Side Effects>
-    None.
+    Removes deleted artifacts from the passed materials queue.
 
   <Returns>
     The updated materials queue (minus deleted artifacts).
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
 
-  matched_materials = fnmatch.filter(
-      source_materials_queue, rule_data["pattern"])
+  # Only materials that also appear in the products queue can fail the rule,
+  # so we only look at those and stop at the first one matched by the pattern
+  _, match = _compile_pattern(rule_data["pattern"])
+  not_deleted_material = next((path
+      for path in source_materials_queue & source_products_queue
+      if match(path)), None)
 
-  for matched_material in matched_materials:
-    if matched_material in source_products_queue:
-      raise RuleVerficationError("Rule '{0}' failed, material '{1}' was found"
-          " in products but should have been deleted."
-              .format(" ".join(rule), matched_material))
+  if not_deleted_material is not None:
+    raise RuleVerficationError("Rule '{0}' failed, material '{1}' was found"
+        " in products but should have been deleted."
+            .format(" ".join(rule), not_deleted_material))
+
+  source_materials_queue.difference_update(_filter_artifacts(
+      source_materials_queue, rule_data["pattern"]))
 
-  return list(set(source_materials_queue) - set(matched_materials))
+  return source_materials_queue
 
 
 def verify_modify_rule(rule, source_materials_queue, source_products_queue,
-      source_materials, source_products):
+      source_materials, source_products, rule_data=None):
   """
   <Purpose>
     The modify rule guarantees that for each material filtered by the pattern
@@ -627,10 +899,10 @@ def verify_modify_rule(rule, source_materials_queue, source_products_queue,
             See https://docs.python.org/2/library/fnmatch.html for wildcards
 
     source_materials_queue:
-            A list of material paths that were not matched by a previous rule.
+            A set of material paths that were not matched by a previous rule.
 
     source_products_queue:
-            A list of product paths that were not matched by a previous rule.
+            A set of product paths that were not matched by a previous rule.
 
     source_materials:
             A dictionary of materials with artifact paths as keys and HASHDICTS
@@ -640,6 +912,10 @@ def verify_modify_rule(rule, source_materials_queue, source_products_queue,
             A dictionary of products with artifact paths as keys and HASHDICTS
             as values. Format is: {<path> : HASHDICT}
 
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
+
   <Exceptions>
     RuleVerficationError
         if the materials and products matched by the pattern are not equal in
@@ -647,19 +923,21 @@ def verify_modify_rule(rule, source_materials_queue, source_products_queue,
         if any material-product pair has the same hash (was not modified).
 
   <Side Effects>
-    None.
+    Removes modified artifacts from the passed materials and products
+    queues.
 
   <Returns>
     The updated materials and products queues (minus modified artifacts).
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
 
   # Filter materials and products using the pattern and create sets to
   # take advantage of Python set operations
-  matched_materials = set(fnmatch.filter(
+  matched_materials = set(_filter_artifacts(
       source_materials_queue, rule_data["pattern"]))
-  matched_products = set(fnmatch.filter(
+  matched_products = set(_filter_artifacts(
       source_products_queue, rule_data["pattern"]))
 
   matched_materials_only = matched_materials - matched_products
@@ -685,11 +963,13 @@ def verify_modify_rule(rule, source_materials_queue, source_products_queue,
           " have the same hash (were not modified)."
               .format(" ".join(rule), path))
 
-  return (list(set(source_materials_queue) - set(matched_materials)),
-      list(set(source_products_queue) - set(matched_products)))
+  source_materials_queue.difference_update(matched_materials)
+  source_products_queue.difference_update(matched_products)
 
+  return source_materials_queue, source_products_queue
 
-def verify_allow_rule(rule, source_artifacts_queue):
+
+def verify_allow_rule(rule, source_artifacts_queue, rule_data=None):
   """
   <Purpose>
     Authorizes the materials or products reported by a link metadata file
@@ -705,28 +985,35 @@ def verify_allow_rule(rule, source_artifacts_queue):
             See https://docs.python.org/2/library/fnmatch.html for wildcards
 
     source_artifacts_queue:
-            A list of artifact paths that were not matched by a previous rule.
+            A set of artifact paths that were not matched by a previous rule.
+
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
 
   <Exceptions>
     FormatError
         if the rule does not conform with the rule format.
 
   <Side Effects>
-    None.
+    Removes matched artifacts from the passed source artifacts queue.
 
   <Returns>
     The source artifact queue minus the files that were matched by the rule.
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
 
-  matched_artifacts = fnmatch.filter(
+  matched_artifacts = _filter_artifacts(
       source_artifacts_queue, rule_data["pattern"])
 
-  return list(set(source_artifacts_queue) - set(matched_artifacts))
+  source_artifacts_queue.difference_update(matched_artifacts)
 
+  return source_artifacts_queue
 
-def verify_disallow_rule(rule, source_artifacts_queue):
+
+def verify_disallow_rule(rule, source_artifacts_queue, rule_data=None):
   """
   <Purpose>
     Verifies that the specified pattern does not match any materials or
@@ -738,7 +1025,11 @@ def verify_disallow_rule(rule, source_artifacts_queue):
             See https://docs.python.org/2/library/fnmatch.html for wildcards
 
     source_artifacts_queue:
-            A list of artifact paths that were not matched by a previous rule.
+            A set of artifact paths that were not matched by a previous rule.
+
+    rule_data: (optional)
+            The rule as returned by `in_toto.artifact_rules.unpack_rule`. If
+            passed, the rule is not unpacked and its format not checked again.
 
   <Exceptions>
     RuleVerficationError
@@ -751,9 +1042,10 @@ def verify_disallow_rule(rule, source_artifacts_queue):
     None.
 
   """
-  rule_data = in_toto.artifact_rules.unpack_rule(rule)
+  if rule_data is None:
+    rule_data = in_toto.artifact_rules.unpack_rule(rule)
 
-  matched_artifacts = fnmatch.filter(
+  matched_artifacts = _filter_artifacts(
       source_artifacts_queue, rule_data["pattern"])
 
   if len(matched_artifacts):
@@ -761,6 +1053,90 @@ def verify_disallow_rule(rule, source_artifacts_queue):
         " artifacts: '{1}' ".format(" ".join(rule), matched_artifacts))
 
 
+def _apply_match_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies a MATCH rule on the source artifacts queue
+  (see `_RULE_VERIFIERS`). """
+  verify_match_rule(rule, source_artifacts_queue, artifacts[source_type], links,
+      rule_data)
+
+
+def _apply_allow_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies an ALLOW rule on the source artifacts queue
+  (see `_RULE_VERIFIERS`). """
+  verify_allow_rule(rule, source_artifacts_queue, rule_data)
+
+
+def _apply_disallow_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies a DISALLOW rule on the source artifacts
+  queue (see `_RULE_VERIFIERS`). """
+  verify_disallow_rule(rule, source_artifacts_queue, rule_data)
+
+
+def _apply_create_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies a CREATE rule on the materials and products
+  queues, independently of the source type (see `_RULE_VERIFIERS`). """
+  verify_create_rule(rule, queues["materials"], queues["products"], rule_data)
+
+  # The create rule only updates the products queue, which in turn only
+  # affects the source artifacts queue if source_type is "products". Artifacts
+  # that a previous rule removed from the source artifacts queue stay removed.
+  if source_type == "products":
+    source_artifacts_queue.intersection_update(queues["products"])
+
+
+def _apply_delete_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies a DELETE rule on the materials and products
+  queues, independently of the source type (see `_RULE_VERIFIERS`). """
+  verify_delete_rule(rule, queues["materials"], queues["products"], rule_data)
+
+  # The delete rule only updates the materials queue, which in turn only
+  # affects the source artifacts queue if source_type is "materials".
+  # Artifacts that a previous rule removed from the source artifacts queue stay
+  # removed.
+  if source_type == "materials":
+    source_artifacts_queue.intersection_update(queues["materials"])
+
+
+def _apply_modify_rule(rule, rule_data, source_type, source_artifacts_queue,
+    queues, artifacts, links):
+  """Internal helper that verifies a MODIFY rule on the materials and products
+  queues, independently of the source type (see `_RULE_VERIFIERS`). """
+  verify_modify_rule(rule, queues["materials"], queues["products"],
+      artifacts["materials"], artifacts["products"], rule_data)
+
+  # The modify rule updates the materials and products queues. We have to
+  # update the source artifacts queue accordingly. Artifacts that a previous
+  # rule removed from the source artifacts queue stay removed.
+  source_artifacts_queue.intersection_update(queues[source_type])
+
+
+# Rule verifiers by (lower case) rule type, as returned by
+# `in_toto.artifact_rules.unpack_rule`. Each verifier takes the rule, the
+# unpacked rule, the source type, the source artifacts queue, dictionaries of
+# materials and products queues and artifacts with "materials" and "products"
+# as keys, and the links, and updates the queues in place or raises a
+# RuleVerficationError.
+#
+# MATCH, ALLOW and DISALLOW rules only use the source artifacts queue. CREATE,
+# DELETE and MODIFY rules use the materials and products queues, which only
+# they update, and remove the artifacts they consume from the source artifacts
+# queue. The source artifacts queue is thus always a subset of the queue of the
+# source type.
+_RULE_VERIFIERS = {
+  "match": _apply_match_rule,
+  "allow": _apply_allow_rule,
+  "disallow": _apply_disallow_rule,
+  "create": _apply_create_rule,
+  "delete": _apply_delete_rule,
+  "modify": _apply_modify_rule
+}
+
+
 def verify_item_rules(source_name, source_type, rules, links):
   """
   <Purpose>
@@ -769,14 +1145,15 @@ def verify_item_rules(source_name, source_type, rules, links):
     together across links.
 
   <Algorithm>
-      1.  Create materials queue and products queue, and a generic artifacts
-          queue based on the source_type (materials or products)
+      1.  Create materials queue and products queue, and a source artifacts
+          queue with the artifacts of the source_type (materials or products)
       2.  For each rule:
-          1.  Apply rule on queues
+          1.  Apply rule on queues, using the verifier for the rule type
+              (see `_RULE_VERIFIERS`)
           2.  If rule verification passes, update queues and continue
 
-      3.  After applying all rules the artifact queue must be empty. Raise
-          and exception otherwise.
+      3.  After applying all rules the source artifacts queue must be empty.
+          Raise and exception otherwise.
 
   <Arguments>
     source_name:
@@ -808,87 +1185,66 @@ def verify_item_rules(source_name, source_type, rules, links):
 
   """
 
-  source_materials = links[source_name].materials
-  source_products = links[source_name].products
-
-  source_materials_queue = source_materials.keys()
-  source_products_queue = source_products.keys()
-
-  # Create generic source artifacts list and queue depending on the source type
-  if source_type == "materials":
-    source_artifacts = source_materials
-    source_artifacts_queue = source_materials_queue
-
-  elif source_type == "products":
-    source_artifacts = source_products
-    source_artifacts_queue = source_products_queue
-
-  else:
+  if source_type not in ("materials", "products"):
     raise securesystemslib.exceptions.FormatError(
         "Argument 'source_type' of function 'verify_item_rules' has to be"
         " one of 'materials' or 'products.'\n"
         "Got:\n\t'{}'".format(source_type))
 
+  artifacts = {
+    "materials": links[source_name].materials,
+    "products": links[source_name].products
+  }
+
+  # Queues are sets for constant time membership tests and removals. They are
+  # updated in place by the rule verifiers.
+  queues = {
+    "materials": set(artifacts["materials"].keys()),
+    "products": set(artifacts["products"].keys())
+  }
+  source_artifacts_queue = set(queues[source_type])
+
+  # Unpack rules for dispatching and rule format verification. The unpacked
+  # rules are passed on, so that each rule is only unpacked and checked once,
+  # for all items with the same rules.
+  rules_data, union_regex = _compile_rules(rules, source_type)
+
+  # If possible, assign each queued artifact to the first rule that matches it
+  # in a single scan of the queue, so that each rule below only has to look at
+  # the artifacts it actually consumes, instead of at the entire queue.
+  buckets = None
+  if union_regex is not None:
+    buckets = _bucket_artifacts_by_rule(source_artifacts_queue, union_regex,
+        len(rules_data))
 
   # Apply (verify) all rule
-  for rule in rules:
+  for index, rule in enumerate(rules):
 
     log.info("Verifying '{}'...".format(" ".join(rule)))
 
-    # Unpack rules for dispatching and rule format verification
-    rule_data = in_toto.artifact_rules.unpack_rule(rule)
-    rule_type = rule_data["type"]
+    rule_data = rules_data[index]
+
+    # The source artifacts queue only holds the artifacts matched by this
+    # rule, and not by a previous rule (see `_SINGLE_PASS_RULE_TYPES`)
+    if buckets is not None:
+      source_artifacts_queue = buckets[index]
 
     # MATCH, ALLOW, DISALLOW operate equally on either products or materials
-    # depending on the source_type
-    if rule_type == "match":
-      source_artifacts_queue = verify_match_rule(
-          rule, source_artifacts_queue, source_artifacts, links)
-
-    elif rule_type == "allow":
-      source_artifacts_queue = verify_allow_rule(rule, source_artifacts_queue)
-
-    elif rule_type == "disallow":
-      verify_disallow_rule(rule, source_artifacts_queue)
-
-
-    # CREATE, DELETE and MODIFY always operate either on products, on materials
-    # or both, independently of the source_type ...
-    elif rule_type == "create":
-      source_products_queue = verify_create_rule(
-          rule, source_materials_queue, source_products_queue)
-
-      # The create rule only updates the products_queue, which in turn
-      # only affects the generic artifacts queue if source_type is "products"
-      if source_type == "products":
-        source_artifacts_queue = source_products_queue
-
-    elif rule_type == "delete":
-      source_materials_queue = verify_delete_rule(
-          rule, source_materials_queue, source_products_queue)
-
-      # The delete rule only updates the materials_queue, which in turn
-      # only affects the generic artifacts queue if source_type is "materials"
-      if source_type == "materials":
-        source_artifacts_queue = source_materials_queue
-
-    elif rule_type == "modify":
-      source_materials_queue, source_products_queue = verify_modify_rule(
-          rule, source_materials_queue, source_products_queue,
-          source_materials, source_products)
-
-      # The modify rule updates materials_queue and products_queue. We have to
-      # update the generic artifacts queue accordingly.
-      if source_type == "materials":
-        source_artifacts_queue = source_materials_queue
-      elif source_type == "products":
-        source_artifacts_queue = source_products_queue
+    # depending on the source_type. CREATE, DELETE and MODIFY always operate
+    # either on products, on materials or both, independently of the
+    # source_type.
+    _RULE_VERIFIERS[rule_data["type"]](rule, rule_data, source_type,
+        source_artifacts_queue, queues, artifacts, links)
+
+  # Artifacts not matched by any rule remain in the queue
+  if buckets is not None:
+    source_artifacts_queue = buckets[-1]
 
   # All artifacts have to be consumed by a rule. If we have applied all rules
   # of a list and there are still artifacts in the queue, we fail.
   if source_artifacts_queue:
     raise RuleVerficationError("{0} '{1}' were not authorized by any rule"
-        " of item '{2}'".format(source_type, source_artifacts_queue,
+        " of item '{2}'".format(source_type, sorted(source_artifacts_queue),
             source_name))
 
 
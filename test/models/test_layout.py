@@ -17,9 +17,14 @@
 
 """
 
+import os
+import shutil
+import tempfile
 import unittest
 import datetime
 from in_toto.models.layout import Layout, Step, Inspection
+from in_toto.models.link import FILENAME_FORMAT
+from in_toto.exceptions import LinkNotFoundError
 import securesystemslib.exceptions
 
 class TestLayoutValidator(unittest.TestCase):
@@ -155,6 +160,37 @@ class TestLayoutValidator(unittest.TestCase):
     self.layout.inspect = [Inspection(name="thirdname")]
     self.layout.validate()
 
+
+class TestLayoutImportStepMetadata(unittest.TestCase):
+  """Test Layout.import_step_metadata_from_files_as_dict() """
+
+  def setUp(self):
+    """Create and change into temp test directory. """
+    self.working_dir = os.getcwd()
+    self.test_dir = os.path.realpath(tempfile.mkdtemp())
+    os.chdir(self.test_dir)
+
+  def tearDown(self):
+    """Change back to working dir and remove temp directory. """
+    os.chdir(self.working_dir)
+    shutil.rmtree(self.test_dir)
+
+  def test_fail_step_not_performed_before_reading_later_steps(self):
+    """Fail with LinkNotFoundError for a step without link, before reading the
+    malformed link of a later step. """
+    keyid = "2dc02526a9a5ab4a8b3f3d8e1d63c5ca2d9f4b9c"
+    layout = Layout()
+    layout.steps = [Step(name="write-code", pubkeys=[keyid]),
+        Step(name="package", pubkeys=[keyid])]
+
+    with open(FILENAME_FORMAT.format(step_name="package", keyid=keyid),
+        "w") as link_file:
+      link_file.write("not a link")
+
+    with self.assertRaises(LinkNotFoundError):
+      layout.import_step_metadata_from_files_as_dict()
+
+
 if __name__ == '__main__':
 
   unittest.main()
@@ -33,6 +33,7 @@ from in_toto.util import (generate_and_write_rsa_keypair,
 from in_toto.models.link import (UNFINISHED_FILENAME_FORMAT, FILENAME_FORMAT)
 
 import securesystemslib.formats
+import securesystemslib.hash
 import securesystemslib.exceptions
 
 class Test_ApplyExcludePatterns(unittest.TestCase):
@@ -223,6 +224,22 @@ class TestRecordArtifactsAsDict(unittest.TestCase):
     self.assertListEqual(sorted(artifacts_dict.keys()),
         sorted(["foo", "bar", "subdir/foosub1", "subdir/foosub2"]))
 
+  def test_record_with_configured_hash_algorithms(self):
+    """Record artifacts hashed with each configured algorithm. """
+    hash_algorithms_orig = in_toto.settings.ARTIFACT_HASH_ALGORITHMS
+    in_toto.settings.ARTIFACT_HASH_ALGORITHMS = ["sha256", "sha512"]
+    try:
+      artifacts_dict = record_artifacts_as_dict(["foo"])
+    finally:
+      in_toto.settings.ARTIFACT_HASH_ALGORITHMS = hash_algorithms_orig
+
+    securesystemslib.formats.HASHDICT_SCHEMA.check_match(artifacts_dict["foo"])
+    self.assertListEqual(sorted(artifacts_dict["foo"].keys()),
+        ["sha256", "sha512"])
+    for algorithm, hexdigest in artifacts_dict["foo"].items():
+      self.assertEqual(hexdigest, securesystemslib.hash.digest_filename(
+          "foo", algorithm).hexdigest())
+
 class TestInTotoRun(unittest.TestCase):
   """"
   Tests runlib.in_toto_run() with different arguments
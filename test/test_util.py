@@ -19,6 +19,7 @@
 """
 
 import os
+import time
 import shutil
 import tempfile
 import unittest
@@ -27,7 +28,7 @@ from mock import patch
 from in_toto.util import (generate_and_write_rsa_keypair,
     import_rsa_key_from_file, import_rsa_public_keys_from_files_as_dict,
     prompt_password, prompt_generate_and_write_rsa_keypair,
-    prompt_import_rsa_key_from_file)
+    prompt_import_rsa_key_from_file, map_concurrently)
 
 import securesystemslib.formats
 import securesystemslib.exceptions
@@ -140,5 +141,58 @@ class TestUtil(unittest.TestCase):
       prompt_import_rsa_key_from_file(key)
 
 
+class TestMapConcurrently(unittest.TestCase):
+  """Test util.map_concurrently(function, iterable, min_items=2). The number
+  of CPUs is patched, so that the pool of threads is used on any machine. """
+
+  def setUp(self):
+    cpu_count_patcher = patch("multiprocessing.cpu_count", return_value=4)
+    cpu_count_patcher.start()
+    self.addCleanup(cpu_count_patcher.stop)
+
+  def test_results_in_order(self):
+    """Return results in the order of the passed iterable. """
+    self.assertListEqual(map_concurrently(lambda x: x * 2, range(20)),
+        [x * 2 for x in range(20)])
+    self.assertListEqual(map_concurrently(lambda x: x * 2, [1]), [2])
+    self.assertListEqual(map_concurrently(lambda x: x * 2, []), [])
+
+  def test_reraise_exception(self):
+    """Re-raise exception raised by the passed function. """
+    def raise_on_odd(x):
+      if x % 2:
+        raise ValueError(x)
+      return x
+
+    with self.assertRaises(ValueError):
+      map_concurrently(raise_on_odd, range(20))
+    with self.assertRaises(ValueError):
+      map_concurrently(raise_on_odd, [1])
+
+  def test_reraise_exception_of_first_item(self):
+    """Re-raise exception of the first failing item, even if a later item
+    fails earlier. """
+    def raise_slowly_on_one(x):
+      if x == 1:
+        time.sleep(0.05)
+      raise ValueError(x)
+
+    with self.assertRaises(ValueError) as context:
+      map_concurrently(raise_slowly_on_one, range(1, 4))
+    self.assertEqual(context.exception.args, (1,))
+
+  def test_sequential_without_enough_items_or_cpus(self):
+    """Don't use the pool for fewer than min_items items or a single CPU. """
+    with patch("in_toto.util._get_thread_pool") as mock_get_thread_pool:
+      self.assertListEqual(
+          map_concurrently(lambda x: x * 2, range(3), min_items=4), [0, 2, 4])
+
+      with patch("multiprocessing.cpu_count", return_value=1):
+        self.assertListEqual(
+            map_concurrently(lambda x: x * 2, range(3)), [0, 2, 4])
+
+      mock_get_thread_pool.assert_not_called()
+
+
 if __name__ == "__main__":
   unittest.main()
@@ -21,6 +21,7 @@
 import os
 import shutil
 import copy
+import fnmatch
 import tempfile
 import unittest
 from mock import patch
@@ -28,13 +29,17 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 import in_toto.settings
+import in_toto.verifylib
 from in_toto.models.link import Link
 from in_toto.models.layout import Step, Inspection, Layout
 from in_toto.verifylib import (verify_delete_rule, verify_create_rule,
     verify_modify_rule, verify_allow_rule, verify_disallow_rule,
     verify_match_rule, verify_item_rules, verify_all_item_rules,
-    verify_command_alignment, run_all_inspections, in_toto_verify,
-    _raise_on_bad_retval)
+    verify_command_alignment, verify_all_steps_signatures,
+    run_all_inspections, in_toto_verify,
+    _raise_on_bad_retval, _filter_artifacts, _compile_rules,
+    _bucket_artifacts_by_rule)
+from in_toto.artifact_rules import unpack_rule
 from in_toto.exceptions import (RuleVerficationError,
     SignatureVerificationError, LayoutExpiredError, BadReturnValueError)
 from in_toto.util import import_rsa_key_from_file
@@ -68,6 +73,38 @@ class Test_RaiseOnBadRetval(unittest.TestCase):
       _raise_on_bad_retval(-1, "bad command")
 
 
+class Test_FilterArtifacts(unittest.TestCase):
+  """Tests internal function that filters artifact paths using a cached and,
+  depending on the pattern, classified glob matcher. """
+
+  def setUp(self):
+    self.paths = ["foo", "foo.py", "foo.tar.gz", "bar.py", "src/foo.py",
+        "src/bar/baz.py", "srcfoo", "src", "d*/foo", "py"]
+
+  def test_filter_like_fnmatch(self):
+    """Filter the same paths as fnmatch.filter for each pattern class. """
+    patterns = ["foo", "src/foo.py", "baz", "*", "*.py", "*py", "*.tar.gz",
+        "src/*", "foo*", "src*", "f?o", "*.p[xy]", "[!f]*", "src/*.py",
+        "d*/foo", "*/*"]
+    for pattern in patterns:
+      self.assertListEqual(_filter_artifacts(self.paths, pattern),
+          fnmatch.filter(self.paths, pattern), pattern)
+
+  def test_filter_with_prefix(self):
+    """Filter paths in literal prefix dir, whose remainder matches pattern. """
+    self.assertListEqual(_filter_artifacts(self.paths, "foo.py", "src"),
+        ["src/foo.py"])
+    self.assertListEqual(_filter_artifacts(self.paths, "*.py", "src"),
+        ["src/foo.py", "src/bar/baz.py"])
+    self.assertListEqual(_filter_artifacts(self.paths, "b*", "src"),
+        ["src/bar/baz.py"])
+    self.assertListEqual(_filter_artifacts(self.paths, "*", "src"),
+        ["src/foo.py", "src/bar/baz.py"])
+    self.assertListEqual(_filter_artifacts(self.paths, "?oo", "d*"),
+        ["d*/foo"])
+    self.assertListEqual(_filter_artifacts(self.paths, "/", "src"), [])
+
+
 class TestRunAllInspections(unittest.TestCase):
   """Test verifylib.run_all_inspections(layout)"""
 
@@ -161,6 +198,44 @@ class TestVerifyCommandAlignment(unittest.TestCase):
           .format(self.command, expected_command))
 
 
+class TestVerifyAllStepsSignatures(unittest.TestCase):
+  """Test verifylib.verify_all_steps_signatures(layout, chain_link_dict) """
+
+  def setUp(self):
+    """Load demo layout and links. """
+    demo_files = os.path.join(
+        os.path.dirname(os.path.realpath(__file__)), "demo_files")
+    self.layout = Layout.read_from_file(
+        os.path.join(demo_files, "demo.layout.template"))
+    self.write_code_link = Link.read_from_file(
+        os.path.join(demo_files, "write-code.c8650e01.link"))
+    self.package_link = Link.read_from_file(
+        os.path.join(demo_files, "package.2dc02526.link"))
+
+  def test_pass_verify_signatures(self):
+    """Verify links signed by the functionaries of their steps. """
+    chain_link_dict = {
+      "write-code": {self.write_code_link.signatures[0]["keyid"]:
+          self.write_code_link},
+      "package": {self.package_link.signatures[0]["keyid"]:
+          self.package_link}
+    }
+    verify_all_steps_signatures(self.layout, chain_link_dict)
+
+  def test_fail_link_signed_by_functionary_of_other_step(self):
+    """Fail with link signed by a layout key that is not one of the step's
+    keys. """
+    chain_link_dict = {
+      "write-code": {self.package_link.signatures[0]["keyid"]:
+          self.package_link},
+      "package": {self.package_link.signatures[0]["keyid"]:
+          self.package_link}
+    }
+    with self.assertRaises(SignatureVerificationError) as context:
+      verify_all_steps_signatures(self.layout, chain_link_dict)
+    self.assertIn("'write-code.2dc02526.link'", str(context.exception))
+
+
 class TestVerifyDeleteRule(unittest.TestCase):
   """Test verify_delete_rule
   takes a rule ["DELETE", "<path pattern>"], a product queue and a
@@ -171,8 +246,8 @@ class TestVerifyDeleteRule(unittest.TestCase):
 
   def test_fail_delete_file(self):
     """["DELETE", "foo"], foo still in products (not deleted), fails. """
-    materials_queue = ["foo"]
-    products_queue = ["foo"]
+    materials_queue = {"foo"}
+    products_queue = {"foo"}
     rule = ["DELETE", "foo"]
     with self.assertRaises(RuleVerficationError):
       verify_delete_rule(rule, materials_queue, products_queue)
@@ -180,8 +255,8 @@ class TestVerifyDeleteRule(unittest.TestCase):
   def test_fail_delete_star(self):
     """["DELETE", "*"], not all (*) materials were deleted, fails. """
 
-    materials_queue = ["foo", "bar"]
-    products_queue = ["foo"]
+    materials_queue = {"foo", "bar"}
+    products_queue = {"foo"}
     rule = ["DELETE", "*"]
 
     with self.assertRaises(RuleVerficationError):
@@ -189,35 +264,35 @@ class TestVerifyDeleteRule(unittest.TestCase):
 
   def test_pass_delete_file(self):
     """["DELETE", "foo"], foo not in products (deleted), passes. """
-    materials_queue = ["foo", "baz"]
-    products_queue = []
+    materials_queue = {"foo", "baz"}
+    products_queue = set()
     rule = ["DELETE", "foo"]
     queue = verify_delete_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, ["baz"])
+    self.assertSetEqual(queue, {"baz"})
 
   def test_pass_delete_star(self):
     """["DELETE", "*"], no materials appear in products (deleted), passes. """
-    materials_queue = ["foo", "baz"]
-    products_queue = []
+    materials_queue = {"foo", "baz"}
+    products_queue = set()
     rule = ["DELETE", "*"]
     queue = verify_delete_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
   def test_pass_delete_nothing_nothing_filtered(self):
     """["DELETE", "bar"], bar in products but not in materials, passes. """
-    materials_queue = []
-    products_queue = ["bar"]
+    materials_queue = set()
+    products_queue = {"bar"}
     rule = ["DELETE", "bar"]
     queue = verify_delete_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
   def test_pass_delete_nothing_empty_queue(self):
     """["DELETE", "*"], nothing in materials, passes. """
-    materials_queue = []
-    products_queue = ["foo", "bar", "baz"]
+    materials_queue = set()
+    products_queue = {"foo", "bar", "baz"}
     rule = ["DELETE", "*"]
     queue = verify_delete_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
 
 class TestVerifyCreateRule(unittest.TestCase):
@@ -231,15 +306,15 @@ class TestVerifyCreateRule(unittest.TestCase):
   def test_fail(self):
     """Different scenarios for failing create rule verification"""
     # Foo already in materials (not created)
-    materials_queue = ["foo"]
-    products_queue = ["foo"]
+    materials_queue = {"foo"}
+    products_queue = {"foo"}
     rule = ["CREATE", "foo"]
     with self.assertRaises(RuleVerficationError):
       verify_create_rule(rule, materials_queue, products_queue)
 
     # Not all (*) products newly created
-    materials_queue = ["foo"]
-    products_queue = ["foo", "bar"]
+    materials_queue = {"foo"}
+    products_queue = {"foo", "bar"}
     rule = ["CREATE", "*"]
     with self.assertRaises(RuleVerficationError):
       verify_create_rule(rule, materials_queue, products_queue)
@@ -247,32 +322,41 @@ class TestVerifyCreateRule(unittest.TestCase):
   def test_pass(self):
     """"Different scenarios for passing create rule verification. """
     # Foo created
-    materials_queue = ["bar"]
-    products_queue = ["foo", "bar"]
+    materials_queue = {"bar"}
+    products_queue = {"foo", "bar"}
     rule = ["CREATE", "foo"]
     queue = verify_create_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, ["bar"])
+    self.assertSetEqual(queue, {"bar"})
 
     # * created
-    materials_queue = []
-    products_queue = ["foo", "bar", "baz"]
+    materials_queue = set()
+    products_queue = {"foo", "bar", "baz"}
     rule = ["CREATE", "*"]
     queue = verify_create_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
     # No products filtered by pattern
-    materials_queue = ["foo", "bar"]
-    products_queue = []
+    materials_queue = {"foo", "bar"}
+    products_queue = set()
     rule = ["CREATE", "*"]
     queue = verify_create_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
     # No products filtered by pattern (pass seems strange)
-    materials_queue = ["foo", "bar"]
-    products_queue = []
+    materials_queue = {"foo", "bar"}
+    products_queue = set()
     rule = ["CREATE", "baz"]
     queue = verify_create_rule(rule, materials_queue, products_queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
+
+  def test_pass_update_queue_in_place(self):
+    """Remove created products from the passed products queue. """
+    materials_queue = {"bar"}
+    products_queue = {"foo", "bar"}
+    rule = ["CREATE", "foo"]
+    queue = verify_create_rule(rule, materials_queue, products_queue)
+    self.assertIs(queue, products_queue)
+    self.assertSetEqual(products_queue, {"bar"})
 
 
 class TestVerifyModifyRule(unittest.TestCase):
@@ -309,40 +393,40 @@ class TestVerifyModifyRule(unittest.TestCase):
     """Different scenarios for passing modify rule verification. """
 
     # Modify single file
-    materials_queue = ["foo"]
-    products_queue = ["foo", "bar"]
+    materials_queue = {"foo"}
+    products_queue = {"foo", "bar"}
     rule = ["MODIFY", "foo"]
     m_queue, p_queue = verify_modify_rule(rule, materials_queue, products_queue,
         self.materials, self.products)
-    self.assertListEqual(m_queue, [])
-    self.assertListEqual(p_queue, ["bar"])
+    self.assertSetEqual(m_queue, set())
+    self.assertSetEqual(p_queue, {"bar"})
 
     # Modify all files from queue
-    materials_queue = ["foo"]
-    products_queue = ["foo"]
+    materials_queue = {"foo"}
+    products_queue = {"foo"}
     rule = ["MODIFY", "*"]
     m_queue, p_queue = verify_modify_rule(rule, materials_queue, products_queue,
         self.materials, self.products)
-    self.assertListEqual(m_queue, p_queue, [])
+    self.assertSetEqual(m_queue, p_queue, set())
 
     # Nothing filtered by pattern, still passes (seems strange)
     rule = ["MODIFY", "baz"]
     m_queue, p_queue = verify_modify_rule(rule, materials_queue, products_queue,
         self.materials, self.products)
-    self.assertListEqual(m_queue, p_queue, [])
+    self.assertSetEqual(m_queue, p_queue, set())
 
     # Nothing filtered by pattern, still passes
     rule = ["MODIFY", "*"]
-    materials_queue = []
-    products_queue = []
+    materials_queue = set()
+    products_queue = set()
     m_queue, p_queue = verify_modify_rule(rule, materials_queue, products_queue,
         self.materials, self.products)
-    self.assertListEqual(m_queue, p_queue, [])
+    self.assertSetEqual(m_queue, p_queue, set())
 
   def test_fail(self):
     """Different scenarios for failing create rule verification. """
-    materials_queue = ["foo", "bar"]
-    products_queue = ["foo", "bar"]
+    materials_queue = {"foo", "bar"}
+    products_queue = {"foo", "bar"}
 
     # Single file not modified
     rule = ["MODIFY", "bar"]
@@ -357,15 +441,15 @@ class TestVerifyModifyRule(unittest.TestCase):
           self.materials, self.products)
 
     # Pattern filters bar as material but not as product
-    materials_queue = ["foo", "bar"]
-    products_queue = ["foo"]
+    materials_queue = {"foo", "bar"}
+    products_queue = {"foo"}
     with self.assertRaises(RuleVerficationError):
       verify_modify_rule(rule, materials_queue, products_queue,
           self.materials, self.products)
 
     # Pattern filters bar as product but not as material
-    materials_queue = ["foo"]
-    products_queue = ["foo", "bar"]
+    materials_queue = {"foo"}
+    products_queue = {"foo", "bar"}
     with self.assertRaises(RuleVerficationError):
       verify_modify_rule(rule, materials_queue, products_queue,
           self.materials, self.products)
@@ -382,19 +466,19 @@ class TestVerifyAllowRule(unittest.TestCase):
 
   def test(self):
     """Test returned artifact queue. """
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["ALLOW", "foo"]
     queue = verify_allow_rule(rule, queue)
-    self.assertListEqual(sorted(queue), ["bar", "foobar"])
+    self.assertSetEqual(queue, {"bar", "foobar"})
 
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["ALLOW", "foo*"]
     queue = verify_allow_rule(rule, queue)
-    self.assertListEqual(queue, ["bar"])
+    self.assertSetEqual(queue, {"bar"})
 
     rule = ["ALLOW", "*"]
     queue = verify_allow_rule(rule, queue)
-    self.assertListEqual(queue, [])
+    self.assertSetEqual(queue, set())
 
 
 class TestVerifyDisallowRule(unittest.TestCase):
@@ -406,28 +490,28 @@ class TestVerifyDisallowRule(unittest.TestCase):
 
   def test_pass(self):
     """ Test different passing disallow rule scenarios. """
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["DISALLOW", "baz"]
     verify_disallow_rule(rule, queue)
 
-    queue = []
+    queue = set()
     rule = ["DISALLOW", "*"]
     verify_disallow_rule(rule, queue)
 
 
   def test_fail(self):
     """ Test different failing disallow rule scenarios. """
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["DISALLOW", "foo"]
     with self.assertRaises(RuleVerficationError):
       verify_disallow_rule(rule, queue)
 
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["DISALLOW", "foo*"]
     with self.assertRaises(RuleVerficationError):
       verify_disallow_rule(rule, queue)
 
-    queue = ["foo", "bar", "foobar"]
+    queue = {"foo", "bar", "foobar"}
     rule = ["DISALLOW", "*"]
     with self.assertRaises(RuleVerficationError):
       verify_disallow_rule(rule, queue)
@@ -480,9 +564,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "foo": {"sha256": self.sha256_foo},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"bar"})
 
 
   def test_pass_match_product(self):
@@ -494,9 +578,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "foo": {"sha256": self.sha256_foo},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"foo"})
 
 
   def test_pass_match_in_source_dir_with_materials(self):
@@ -508,9 +592,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "dist/foo": {"sha256": self.sha256_foo},
       "dist/bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["dist/bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"dist/bar"})
 
   def test_pass_match_in_source_dir_with_products(self):
     """["MATCH", "bar", "IN", "dist", "WITH", "PRODUCTS", "FROM", "link-1"],
@@ -521,9 +605,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "dist/bar": {"sha256": self.sha256_bar},
       "dist/foo": {"sha256": self.sha256_foo}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["dist/foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"dist/foo"})
 
   def test_pass_match_with_materials_in_destination_dir(self):
     """["MATCH", "foo", "WITH", "MATERIALS", "IN", "dev", "FROM", "link-1"],
@@ -534,9 +618,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "foo": {"sha256": self.sha256_foo},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"bar"})
 
   def test_pass_match_with_products_in_destination_dir(self):
     """["MATCH", "bar", "WITH", "PRODUCTS", "IN", "dev", "FROM", "link-1"],
@@ -547,9 +631,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "bar": {"sha256": self.sha256_bar},
       "foo": {"sha256": self.sha256_foo}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"foo"})
 
   def test_pass_match_material_star(self):
     """["MATCH", "foo*", "WITH", "MATERIALS", "FROM", "link-1"]],
@@ -561,9 +645,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "foobar": {"sha256": self.sha256_foobar},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"bar"})
 
   def test_pass_match_product_star(self):
     """["MATCH", "bar*", "WITH", "PRODUCTS", "FROM", "link-1"],
@@ -575,9 +659,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "barfoo": {"sha256": self.sha256_barfoo},
       "foo": {"sha256": self.sha256_foo}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"foo"})
 
   def test_pass_match_star_in_source_dir_with_materials(self):
     """["MATCH", "foo*", "IN", "dist", "WITH", "MATERIALS", "FROM", "link-1"],
@@ -589,9 +673,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "dist/foobar": {"sha256": self.sha256_foobar},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"bar"})
 
   def test_pass_match_star_in_source_dir_with_products(self):
     """["MATCH", "bar*", "WITH", "PRODUCTS", "IN", "dist", "FROM", "link-1"],
@@ -603,9 +687,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "dist/barfoo": {"sha256": self.sha256_barfoo},
       "foo": {"sha256": self.sha256_foo}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"foo"})
 
   def test_pass_match_star_in_with_materials_in_destination_dir(self):
     """["MATCH", "foo*", "WITH", "MATERIALS", "IN", "dist", "FROM", "link-1"],
@@ -617,9 +701,9 @@ class TestVerifyMatchRule(unittest.TestCase):
       "foobar": {"sha256": self.sha256_foobar},
       "bar": {"sha256": self.sha256_bar}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["bar"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"bar"})
 
   def test_pass_match_star_with_products_destination_dir(self):
     """["MATCH", "bar*", "WITH", "PRODUCTS", "IN", "dev", "FROM", "link-1"],
@@ -631,9 +715,53 @@ class TestVerifyMatchRule(unittest.TestCase):
       "barfoo": {"sha256": self.sha256_barfoo},
       "foo": {"sha256": self.sha256_foo}
     }
-    queue = artifacts.keys()
-    self.assertListEqual(
-        verify_match_rule(rule, queue, artifacts, self.links), ["foo"])
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"foo"})
+
+  def test_pass_match_in_source_dir_prefix_does_not_glob(self):
+    """["MATCH", "foo", "IN", "d*", "WITH", "MATERIALS", "FROM", "link-1"],
+    source prefix is taken literally, dist/foo is not filtered, passes. """
+
+    rule = ["MATCH", "foo", "IN", "d*", "WITH", "MATERIALS", "FROM", "link-1"]
+    artifacts = {
+      "dist/foo": {"sha256": self.sha256_foobar},
+    }
+    queue = set(artifacts.keys())
+    self.assertSetEqual(
+        verify_match_rule(rule, queue, artifacts, self.links), {"dist/foo"})
+
+  def test_fail_report_path_not_in_destination(self):
+    """["MATCH", "foo*", "WITH", "MATERIALS", "FROM", "link-1"],
+    foo matches but foobaz is not found in destination materials, fails for
+    foobaz. """
+
+    rule = ["MATCH", "foo*", "WITH", "MATERIALS", "FROM", "link-1"]
+    artifacts = {
+      "foo": {"sha256": self.sha256_foo},
+      "foobaz": {"sha256": self.sha256_foo}
+    }
+    queue = set(artifacts.keys())
+    with self.assertRaises(RuleVerficationError) as context:
+      verify_match_rule(rule, queue, artifacts, self.links)
+
+    self.assertIn("'foobaz' not found in materials", str(context.exception))
+
+  def test_fail_report_hash_not_equal(self):
+    """["MATCH", "foo*", "WITH", "MATERIALS", "FROM", "link-1"],
+    foobar matches but foo hashes don't match, fails for foo. """
+
+    rule = ["MATCH", "foo*", "WITH", "MATERIALS", "FROM", "link-1"]
+    artifacts = {
+      "foo": {"sha256": self.sha256_bar},
+      "foobar": {"sha256": self.sha256_foobar}
+    }
+    queue = set(artifacts.keys())
+    with self.assertRaises(RuleVerficationError) as context:
+      verify_match_rule(rule, queue, artifacts, self.links)
+
+    self.assertIn("hashes don't match", str(context.exception))
+    self.assertIn("'foo'", str(context.exception))
 
   def test_fail_destination_link_not_found(self):
     """["MATCH", "bar", "WITH", "MATERIALS", "FROM", "link-null"],
@@ -641,7 +769,7 @@ class TestVerifyMatchRule(unittest.TestCase):
 
     rule = ["MATCH", "bar", "WITH", "MATERIALS", "FROM", "link-null"]
     artifacts = {}
-    queue = artifacts.keys()
+    queue = set(artifacts.keys())
     with self.assertRaises(RuleVerficationError):
       verify_match_rule(rule, queue, artifacts, self.links)
 
@@ -653,7 +781,7 @@ class TestVerifyMatchRule(unittest.TestCase):
     artifacts = {
       "bar": {"sha256": self.sha256_bar},
     }
-    queue = artifacts.keys()
+    queue = set(artifacts.keys())
     with self.assertRaises(RuleVerficationError):
       verify_match_rule(rule, queue, artifacts, self.links)
 
@@ -665,7 +793,7 @@ class TestVerifyMatchRule(unittest.TestCase):
     artifacts = {
       "foo": {"sha256": self.sha256_foo},
     }
-    queue = artifacts.keys()
+    queue = set(artifacts.keys())
     with self.assertRaises(RuleVerficationError):
       verify_match_rule(rule, queue, artifacts, self.links)
 
@@ -677,7 +805,7 @@ class TestVerifyMatchRule(unittest.TestCase):
     artifacts = {
       "bar": {"sha256": "aaaaaaaaaa"},
     }
-    queue = artifacts.keys()
+    queue = set(artifacts.keys())
     with self.assertRaises(RuleVerficationError):
       verify_match_rule(rule, queue, artifacts, self.links)
 
@@ -740,9 +868,185 @@ class TestVerifyItemRules(unittest.TestCase):
   def test_fail_not_consumed_artifacts(self):
     """Fail with not consumed artifacts after applying all rules. """
     rules = []
+    with self.assertRaises(RuleVerficationError) as context:
+      verify_item_rules(self.item_name, "materials", rules, self.links)
+    self.assertEqual(str(context.exception), "materials"
+        " '['bar', 'foo', 'foobar']' were not authorized by any rule of item"
+        " 'item'")
+
+  def test_pass_single_pass_rules_consume_before_disallow(self):
+    """Pass with single pass rules, where artifacts are consumed by rules
+    before a disallow rule would match them. """
+    rules = [
+      ["CREATE", "baz"],
+      ["MATCH", "foo", "WITH", "PRODUCTS", "FROM", "item"],
+      ["ALLOW", "b*"],
+      ["DISALLOW", "*"],
+    ]
+    verify_item_rules(self.item_name, "products", rules, self.links)
+
+  def test_fail_single_pass_rules_disallow(self):
+    """Fail with single pass rules, where a disallow rule matches an artifact
+    not consumed by a previous rule. """
+    rules = [
+      ["ALLOW", "b*"],
+      ["DISALLOW", "*"],
+      ["ALLOW", "*"],
+    ]
+    with self.assertRaises(RuleVerficationError):
+      verify_item_rules(self.item_name, "products", rules, self.links)
+
+  def test_fail_single_pass_rules_not_consumed_artifacts(self):
+    """Fail with single pass rules, where an artifact is not matched by any
+    rule. """
+    rules = [
+      ["DELETE", "foobar"],
+      ["ALLOW", "ba?"],
+    ]
     with self.assertRaises(RuleVerficationError):
       verify_item_rules(self.item_name, "materials", rules, self.links)
 
+  def test_fail_single_pass_rules_match_link_not_found(self):
+    """Fail with single pass rules, where a match rule that matches no
+    artifact has no destination link. """
+    rules = [
+      ["ALLOW", "*"],
+      ["MATCH", "foo", "WITH", "PRODUCTS", "FROM", "missing"],
+    ]
+    with self.assertRaises(RuleVerficationError):
+      verify_item_rules(self.item_name, "products", rules, self.links)
+
+  def test_pass_create_delete_modify_after_allow(self):
+    """Pass with create, delete or modify rules after an allow rule that
+    consumed all artifacts. The consumed artifacts must not be added back to
+    the queue. """
+    for source_type, rules in [
+        ("products", [["ALLOW", "*"], ["CREATE", "baz"]]),
+        ("materials", [["ALLOW", "*"], ["DELETE", "foobar"]]),
+        ("products", [["ALLOW", "*"], ["MODIFY", "bar"]]),
+        ("materials", [["ALLOW", "*"], ["MODIFY", "bar"]])]:
+      verify_item_rules(self.item_name, source_type, rules, self.links)
+
+  def test_fail_create_delete_after_allow_or_match(self):
+    """Fail with create or delete rules after an allow or match rule, where
+    the create or delete rule matches artifacts already consumed by the allow
+    or match rule, that were not created or deleted. """
+    for source_type, rules, message in [
+        ("products", [["ALLOW", "*"], ["CREATE", "foo"]],
+            "product 'foo' was found in materials"),
+        ("products", [["MATCH", "foo", "WITH", "PRODUCTS", "FROM", "item"],
+            ["CREATE", "foo"]], "product 'foo' was found in materials"),
+        ("materials", [["ALLOW", "*"], ["DELETE", "foo"]],
+            "material 'foo' was found in products"),
+        ("materials", [["ALLOW", "*"], ["DELETE", "*"]],
+            "was found in products")]:
+      with self.assertRaises(RuleVerficationError) as context:
+        verify_item_rules(self.item_name, source_type, rules, self.links)
+      self.assertIn(message, str(context.exception))
+
+  def test_single_pass_and_rule_by_rule_outcomes(self):
+    """Verify rules with and without an appended modify rule that matches
+    nothing but prevents verification in a single pass. Both pass or both fail
+    as expected. """
+    def passes(source_type, rules):
+      try:
+        verify_item_rules(self.item_name, source_type, rules, self.links)
+      except RuleVerficationError:
+        return False
+      return True
+
+    for source_type, rules, expected in [
+        ("products", [["ALLOW", "*"], ["CREATE", "baz"]], True),
+        ("products", [["ALLOW", "*"], ["CREATE", "foo"]], False),
+        ("products", [["MATCH", "foo", "WITH", "PRODUCTS", "FROM", "item"],
+            ["CREATE", "foo"]], False),
+        ("products", [["CREATE", "baz"], ["ALLOW", "*"]], True),
+        ("products", [["CREATE", "foo"], ["ALLOW", "*"]], False),
+        ("products", [["ALLOW", "b*"], ["DISALLOW", "*"]], False),
+        ("products", [["ALLOW", "f*"], ["ALLOW", "b*"]], True),
+        ("materials", [["ALLOW", "*"], ["DELETE", "foobar"]], True),
+        ("materials", [["ALLOW", "*"], ["DELETE", "foo"]], False),
+        ("materials", [["DELETE", "foobar"], ["ALLOW", "*"]], True),
+        ("materials", [["DELETE", "foo"], ["ALLOW", "*"]], False),
+        ("materials", [["ALLOW", "foo*"], ["DISALLOW", "*"]], False),
+        ("materials", [["ALLOW", "foo*"], ["ALLOW", "bar"]], True)]:
+      self.assertEqual(passes(source_type, rules), expected,
+          (source_type, rules))
+      self.assertEqual(
+          passes(source_type, rules + [["MODIFY", "does-not-exist"]]),
+          expected, (source_type, rules))
+
+
+class Test_CompileRules(unittest.TestCase):
+  """Test verifylib._compile_rules(rules, source_type) and
+  verifylib._bucket_artifacts_by_rule(artifact_paths, union_regex,
+  rules_count). """
+
+  def test_bucket_by_first_matching_rule(self):
+    """Assign each path to the first rule that matches it. """
+    rules = [
+      ["ALLOW", "*.py"],
+      ["MATCH", "*", "IN", "src", "WITH", "PRODUCTS", "FROM", "item"],
+      ["DISALLOW", "*"]
+    ]
+    rules_data, union_regex = _compile_rules(rules, "products")
+    self.assertListEqual(rules_data, [unpack_rule(rule) for rule in rules])
+    buckets = _bucket_artifacts_by_rule(
+        ["foo.py", "src/foo.py", "src/bar", "srcbar", "baz"], union_regex,
+        len(rules))
+    self.assertListEqual(buckets, [{"foo.py", "src/foo.py"}, {"src/bar"},
+        {"srcbar", "baz"}, set()])
+
+  def test_not_compiled_to_single_regex(self):
+    """No single regex for rules that can't be verified in a single pass. """
+    for rules, source_type in [
+        ([["ALLOW", "*"]], "products"),
+        ([["ALLOW", "*"], ["DELETE", "*"]], "products"),
+        ([["ALLOW", "*"], ["MODIFY", "*"]], "materials"),
+        ([["ALLOW", "*"], ["CREATE", "foo"]], "products"),
+        ([["MATCH", "*", "WITH", "MATERIALS", "FROM", "item"],
+            ["DELETE", "foo"]], "materials")]:
+      rules_data, union_regex = _compile_rules(rules, source_type)
+      self.assertListEqual(rules_data, [unpack_rule(rule) for rule in rules])
+      self.assertIsNone(union_regex)
+
+  def test_compiled_to_single_regex(self):
+    """Single regex for rules that can be verified in a single pass, i.e.
+    without create or delete rules after an allow or match rule. """
+    for rules, source_type in [
+        ([["CREATE", "foo"], ["ALLOW", "*"]], "products"),
+        ([["DELETE", "foo"], ["DISALLOW", "bar"], ["ALLOW", "*"]],
+            "materials")]:
+      rules_data, union_regex = _compile_rules(rules, source_type)
+      self.assertIsNotNone(union_regex)
+
+  def test_cache_identical_rules(self):
+    """Return the cached result for identical rules and source type. """
+    rules = [["CREATE", "foo"], ["ALLOW", "*"]]
+    compiled = _compile_rules(rules, "products")
+    self.assertIs(_compile_rules([list(rule) for rule in rules], "products"),
+        compiled)
+    self.assertIsNot(_compile_rules(rules, "materials"), compiled)
+
+  def test_fail_invalid_rules_despite_cache(self):
+    """Raise format error for invalid rules, even if an equal valid rule was
+    cached, or if the rule can't be used as cache key. """
+    _compile_rules([["ALLOW", "*"], ["CREATE", "foo"]], "products")
+    with self.assertRaises(securesystemslib.exceptions.FormatError):
+      _compile_rules([("ALLOW", "*"), ("CREATE", "foo")], "products")
+    with self.assertRaises(securesystemslib.exceptions.FormatError):
+      _compile_rules([["ALLOW", ["*"]]], "products")
+
+  def test_cache_size_bounded(self):
+    """Clear the caches when they are full. """
+    with patch("in_toto.verifylib._MAX_CACHE_SIZE", 2):
+      for index in range(5):
+        _compile_rules([["ALLOW", "foo{}".format(index)],
+            ["DISALLOW", "*"]], "products")
+        _filter_artifacts([], "foo{}*".format(index))
+        self.assertLessEqual(len(in_toto.verifylib._compiled_rules), 2)
+        self.assertLessEqual(len(in_toto.verifylib._compiled_patterns), 2)
+
 
 class TestVerifyAllItemRules(unittest.TestCase):
   """Test verifylib.verify_all_item_rules(items, links). """
@@ -835,6 +1139,38 @@ class TestVerifyAllItemRules(unittest.TestCase):
     """Pass rule verification for dummy supply chain Inspections. """
     verify_all_item_rules(self.inspections, self.links)
 
+  def test_pass_verify_all_step_and_inspection_rules(self):
+    """Pass rule verification for Steps and Inspections. """
+    items = self.steps + self.inspections + [
+        Step(name="inspect-package",
+            material_matchrules=[
+                ["MATCH", "foo.tar.gz", "WITH", "PRODUCTS", "FROM", "package"]
+            ]
+        )
+    ]
+    links = dict(self.links)
+    links["inspect-package"] = Link(name="inspect-package",
+        materials=self.links["package"].products)
+
+    verify_all_item_rules(items, links)
+
+  def test_fail_verify_all_step_and_inspection_rules(self):
+    """Fail rule verification for Steps and Inspections, where the rules of the
+    last item fail. """
+    items = self.steps + self.inspections + [
+        Step(name="inspect-package",
+            material_matchrules=[
+                ["MATCH", "foo.tar.gz", "WITH", "PRODUCTS", "FROM", "package"]
+            ]
+        )
+    ]
+    links = dict(self.links)
+    links["inspect-package"] = Link(name="inspect-package",
+        materials={"foo.tar.gz": {"sha256": self.sha256_foo}})
+
+    with self.assertRaises(RuleVerficationError):
+      verify_all_item_rules(items, links)
+
 
 class TestInTotoVerify(unittest.TestCase):
   """